@@ -6,26 +6,65 @@ Flask web app for Top HAT
 - Handles RS-485 send/receive
 - USB device monitoring
 - Raspberry Pi GPIO control
+- Pushes on-change updates to the browser over WebSocket
 """
 import atexit
+import gzip
+import hashlib
+import json
 import logging
+import os
+import threading
+import time
 from flask import Flask, jsonify, render_template, request, abort
+from flask_socketio import SocketIO, emit
 from adc_reader import read_all_channels
 from mcp_gpio import setup_gpio, read_all, write_outputs, cleanup as mcp_cleanup
 import rs485_handler
 import usb_status
 import rpi_gpio
+import reactor
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Configure logging (override with e.g. LOG_LEVEL=WARNING)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.config["TEMPLATES_AUTO_RELOAD"] = False
+app.jinja_env.auto_reload = False
+socketio = SocketIO(app, async_mode="threading")
 
 # --- Global state ---
-current_outputs = {"A": 0x00, "B": 0x00}
+# Last values latched into the MCP23017 OLATA/OLATB registers
+_OUT_A = 0x00
+_OUT_B = 0x00
+_OUT_LOCK = threading.Lock()
 hardware_status = {"mcp23017": False, "rs485": False, "rpi_gpio": False}
 
+# --- WebSocket sampler state ---
+SAMPLE_INTERVAL = 0.2     # seconds between samples (~5 Hz)
+_sampler_running = False
+_last_snapshot = {}
+_client_count = 0
+_client_lock = threading.Lock()
+
+# --- /json response cache ---
+JSON_CACHE_TTL = 0.25     # seconds a built /json body is reused
+_json_cache = {"ts": 0.0, "body": None, "etag": None, "gen": 0}
+_json_cache_lock = threading.Lock()    # guards _json_cache
+_json_build_lock = threading.Lock()    # one rebuild at a time (owns _RESPONSE_BUF)
+
+# 8-bit port value -> "01010101" lookup table
+_BITSTR = tuple(format(i, "08b") for i in range(256))
+
+# JSON-friendly copy of rpi_gpio.SAFE_PINS (a frozenset)
+_SAFE_PINS_LIST = sorted(rpi_gpio.get_safe_pins())
+
 def init_hardware():
     """Initialize all hardware components with graceful error handling."""
     hardware_status = {
@@ -46,6 +85,7 @@ def init_hardware():
     # Init RS-485 (non-critical - continue if it fails)
     try:
         rs485_handler.init_gpio()
+        rs485_handler.add_rx_callback(_push_rs485_rx)
         rs485_handler.start_listener()
         hardware_status["rs485"] = True
         logger.info("RS-485 handler initialized")
@@ -64,6 +104,12 @@ def init_hardware():
     except Exception as e:
         logger.warning(f"Raspberry Pi GPIO initialization failed: {e}")
     
+    # USB hotplug monitor (optional - falls back to lsusb polling)
+    usb_status.start_monitor()
+    
+    # Start the WebSocket sampler (idles until a client connects)
+    start_sampler()
+    
     # Log overall status
     working_components = sum(hardware_status.values())
     logger.info(f"Hardware initialization complete: {working_components}/3 components working")
@@ -77,9 +123,12 @@ def init_hardware():
 def cleanup_hardware():
     """Clean up all hardware resources."""
     try:
+        stop_sampler()
+        usb_status.stop_monitor()
         mcp_cleanup()
         rs485_handler.cleanup()
         rpi_gpio.cleanup_rpi_gpio()
+        reactor.stop()
         logger.info("Hardware cleanup completed")
     except Exception as e:
         logger.error(f"Hardware cleanup failed: {e}")
@@ -87,87 +136,217 @@ def cleanup_hardware():
 # Register cleanup function to run on exit
 atexit.register(cleanup_hardware)
 
+def _prerender_index():
+    """Render index.html once (it takes no context) and gzip it."""
+    with app.app_context():
+        html = render_template("index.html").encode()
+    etag = hashlib.blake2b(html, digest_size=8).hexdigest()
+    return html, gzip.compress(html, 6), etag
+
+_INDEX_HTML, _INDEX_GZ, _INDEX_ETAG = _prerender_index()
+
 @app.route("/")
 def index():
     """Serve the main page."""
-    return render_template("index.html")
+    if "gzip" in request.accept_encodings:
+        response = app.response_class(_INDEX_GZ, mimetype="text/html")
+        response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(_INDEX_ETAG + "-gz")
+    else:
+        response = app.response_class(_INDEX_HTML, mimetype="text/html")
+        response.set_etag(_INDEX_ETAG)
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
-@app.route("/json")
-def json_data():
-    """Return ADC + GPIO + RS-485 + USB + RPi GPIO data in JSON format."""
+def _new_response_buf():
+    """Return an empty /json response skeleton."""
+    return {
+        "hardware_status": hardware_status,
+        "adc": {},
+        "gpio": {"A": _BITSTR[0], "B": _BITSTR[0]},
+        "outputs": {"A": 0x00, "B": 0x00},
+        "rs485_last": None,
+        "usb_connected": False,
+        "usb_devices": (),
+        "rpi_gpio": {"configs": {}, "states": {}, "safe_pins": []}
+    }
+
+def _dumps(data):
+    """Serialize a response dict to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+def collect_data(response_data=None):
+    """Fill a response buffer with ADC + GPIO + RS-485 + USB + RPi GPIO data.
+    
+    The buffer is updated in place; a fresh one is allocated if none is given.
+    """
+    if response_data is None:
+        response_data = _new_response_buf()
+    response_data["hardware_status"] = hardware_status
+    
+    # Only try to read ADC if available
     try:
-        response_data = {
-            "hardware_status": hardware_status
-        }
-        
-        # Only try to read ADC if available
+        response_data["adc"] = read_all_channels()
+    except Exception as e:
+        logger.debug("ADC read failed: %s", e)
+        response_data["adc"] = {}
+    
+    # Only try to read MCP23017 GPIO if initialized
+    gpio = response_data["gpio"]
+    if hardware_status["mcp23017"]:
         try:
-            adc_data = read_all_channels()
-            response_data["adc"] = adc_data
+            a_val, b_val = read_all()
+            gpio["A"] = _BITSTR[a_val]
+            gpio["B"] = _BITSTR[b_val]
         except Exception as e:
-            logger.debug(f"ADC read failed: {e}")
-            response_data["adc"] = {}
-        
-        # Only try to read MCP23017 GPIO if initialized
-        if hardware_status["mcp23017"]:
-            try:
-                a_val, b_val = read_all()
-                response_data["gpio"] = {
-                    "A": format(a_val, "08b"),
-                    "B": format(b_val, "08b")
-                }
-                response_data["outputs"] = current_outputs
-            except Exception as e:
-                logger.debug(f"MCP23017 read failed: {e}")
-                response_data["gpio"] = {"A": "00000000", "B": "00000000"}
-                response_data["outputs"] = current_outputs
-        else:
-            response_data["gpio"] = {"A": "00000000", "B": "00000000"}
-            response_data["outputs"] = current_outputs
-        
-        # Only try to read RS-485 if initialized
-        if hardware_status["rs485"]:
-            try:
-                last_msg = rs485_handler.get_last_message()
-                response_data["rs485_last"] = last_msg
-            except Exception as e:
-                logger.debug(f"RS-485 read failed: {e}")
-                response_data["rs485_last"] = None
-        else:
+            logger.debug("MCP23017 read failed: %s", e)
+            gpio["A"] = gpio["B"] = _BITSTR[0]
+    else:
+        gpio["A"] = gpio["B"] = _BITSTR[0]
+    outputs = response_data["outputs"]
+    outputs["A"] = _OUT_A
+    outputs["B"] = _OUT_B
+    
+    # Only try to read RS-485 if initialized
+    if hardware_status["rs485"]:
+        try:
+            response_data["rs485_last"] = rs485_handler.get_last_message()
+        except Exception as e:
+            logger.debug("RS-485 read failed: %s", e)
             response_data["rs485_last"] = None
-        
-        # USB status (usually works)
+    else:
+        response_data["rs485_last"] = None
+    
+    # USB status (usually works)
+    try:
+        response_data["usb_connected"] = usb_status.usb_connected()
+        response_data["usb_devices"] = tuple(
+            d.to_dict() for d in usb_status.list_usb_devices()
+        )
+    except Exception as e:
+        logger.debug("USB read failed: %s", e)
+        response_data["usb_connected"] = False
+        response_data["usb_devices"] = ()
+    
+    # RPi GPIO (should usually work)
+    rpi = response_data["rpi_gpio"]
+    if hardware_status["rpi_gpio"]:
         try:
-            response_data["usb_connected"] = usb_status.usb_connected()
-            response_data["usb_devices"] = usb_status.list_usb_devices()
+            rpi["configs"] = rpi_gpio.get_all_configs()
+            rpi["states"] = rpi_gpio.get_all_pin_states()
+            rpi["safe_pins"] = _SAFE_PINS_LIST
         except Exception as e:
-            logger.debug(f"USB read failed: {e}")
-            response_data["usb_connected"] = False
-            response_data["usb_devices"] = []
-        
-        # RPi GPIO (should usually work)
-        if hardware_status["rpi_gpio"]:
-            try:
-                response_data["rpi_gpio"] = {
-                    "configs": rpi_gpio.get_all_configs(),
-                    "states": rpi_gpio.get_all_pin_states(),
-                    "safe_pins": rpi_gpio.get_safe_pins()
-                }
-            except Exception as e:
-                logger.debug(f"RPi GPIO read failed: {e}")
-                response_data["rpi_gpio"] = {
-                    "configs": {},
-                    "states": {},
-                    "safe_pins": []
-                }
-        else:
-            response_data["rpi_gpio"] = {
-                "configs": {},
-                "states": {},
-                "safe_pins": []
-            }
+            logger.debug("RPi GPIO read failed: %s", e)
+            rpi["configs"], rpi["states"], rpi["safe_pins"] = {}, {}, []
+    else:
+        rpi["configs"], rpi["states"], rpi["safe_pins"] = {}, {}, []
+    
+    return response_data
+
+# --- WebSocket push ---
+def _sample_tick():
+    """Reactor job: sample hardware and broadcast changed fields."""
+    global _last_snapshot
+    
+    # Don't touch the I2C bus when nobody is listening
+    if _client_count == 0:
+        return
+    
+    try:
+        snapshot = collect_data()
+    except Exception as e:
+        logger.error("Sampler read failed: %s", e)
+        return
+    
+    changed_fields = {
+        key: value for key, value in snapshot.items()
+        if _last_snapshot.get(key) != value
+    }
+    _last_snapshot = snapshot
+    
+    if changed_fields:
+        socketio.emit("delta", changed_fields)
+
+def start_sampler():
+    """Schedule the sampler on the shared reactor thread (non-blocking)."""
+    global _sampler_running
+    if _sampler_running:
+        return
+    _sampler_running = True
+    reactor.add_periodic(SAMPLE_INTERVAL, _sample_tick)
+    reactor.start()
+    logger.info("WebSocket sampler started")
+
+def stop_sampler():
+    """Unschedule the sampler."""
+    global _sampler_running
+    if _sampler_running:
+        reactor.remove_periodic(_sample_tick)
+        _sampler_running = False
+
+def _push_rs485_rx(msg, ts):
+    """RS-485 RX callback: forward the line to every subscriber right away."""
+    invalidate_json_cache()
+    socketio.emit("rs485_rx", {"msg": msg, "ts": ts})
+
+@socketio.on("connect")
+def ws_connect():
+    """Track a new subscriber and send it the latest known state."""
+    global _client_count
+    with _client_lock:
+        _client_count += 1
+    if _last_snapshot:
+        emit("delta", _last_snapshot)
+
+@socketio.on("disconnect")
+def ws_disconnect():
+    """Stop counting a subscriber that went away."""
+    global _client_count
+    with _client_lock:
+        _client_count = max(0, _client_count - 1)
+
+# Long-lived /json buffer, only touched with _json_build_lock held
+_RESPONSE_BUF = _new_response_buf()
+
+def invalidate_json_cache():
+    """Force the next /json request to re-read the hardware."""
+    # Bumping the generation stops a rebuild already in flight from
+    # stamping its (possibly older) body as fresh
+    with _json_cache_lock:
+        _json_cache["gen"] += 1
+        _json_cache["ts"] = 0.0
+
+@app.route("/json")
+def json_data():
+    """Return ADC + GPIO + RS-485 + USB + RPi GPIO data in JSON format."""
+    try:
+        # One thread rebuilds the body per TTL window; the rest share it
+        with _json_build_lock:
+            with _json_cache_lock:
+                now = time.monotonic()
+                stale = now - _json_cache["ts"] >= JSON_CACHE_TTL
+                gen = _json_cache["gen"]
+            
+            if stale:
+                new_body = _dumps(collect_data(_RESPONSE_BUF))
+                new_etag = hashlib.blake2b(new_body, digest_size=8).hexdigest()
+            
+            with _json_cache_lock:
+                if stale:
+                    _json_cache["body"] = new_body
+                    _json_cache["etag"] = new_etag
+                    # Invalidated mid-build: serve it, but rebuild next time
+                    if gen == _json_cache["gen"]:
+                        _json_cache["ts"] = now
+                body = _json_cache["body"]
+                etag = _json_cache["etag"]
         
-        return jsonify(response_data)
+        response = app.response_class(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response.make_conditional(request)
         
     except Exception as e:
         logger.error(f"Error reading sensor data: {e}")
@@ -176,11 +355,7 @@ def json_data():
 @app.route("/gpio/write/<port>/<int:pin>/<int:state>", methods=["POST"])
 def gpio_write(port, pin, state):
     """Toggle a single MCP23017 output pin."""
-    current_outputs
-    
-    # Check if MCP23017 is available
-    if not hardware_status["mcp23017"]:
-        return jsonify({"error": "MCP23017 not available"}), 503
+    global _OUT_A, _OUT_B
     
     # Validate inputs
     port = port.upper()
@@ -195,20 +370,30 @@ def gpio_write(port, pin, state):
     
     try:
         mask = 1 << pin
-        if state == 1:
-            current_outputs[port] |= mask
-        else:
-            current_outputs[port] &= ~mask
+        with _OUT_LOCK:
+            new_a, new_b = _OUT_A, _OUT_B
+            if port == "A":
+                new_a = (new_a | mask) if state else (new_a & ~mask)
+            else:
+                new_b = (new_b | mask) if state else (new_b & ~mask)
+            
+            # Skip the I2C write if the latch already holds this value
+            unchanged = (new_a, new_b) == (_OUT_A, _OUT_B)
+            if not unchanged:
+                write_outputs(new_a, new_b)
+                _OUT_A, _OUT_B = new_a, new_b
         
-        write_outputs(current_outputs["A"], current_outputs["B"])
-        logger.info(f"GPIO {port}{pin} set to {state}")
+        if not unchanged:
+            invalidate_json_cache()
+            logger.debug("GPIO %s%d set to %d", port, pin, state)
         
         return jsonify({
             "success": True,
+            "unchanged": unchanged,
             "port": port,
             "pin": pin,
             "state": state,
-            "outputs": current_outputs
+            "outputs": {"A": new_a, "B": new_b}
         })
         
     except Exception as e:
@@ -218,10 +403,6 @@ def gpio_write(port, pin, state):
 @app.route("/rpi_gpio/setup/<int:pin>/<mode>", methods=["POST"])
 def rpi_gpio_setup(pin, mode):
     """Setup a Raspberry Pi GPIO pin as input or output."""
-    # Check if RPi GPIO is available
-    if not hardware_status["rpi_gpio"]:
-        return jsonify({"error": "Raspberry Pi GPIO not available"}), 503
-        
     try:
         if pin not in rpi_gpio.get_safe_pins():
             return jsonify({"error": f"Pin {pin} is not safe to use"}), 400
@@ -235,6 +416,7 @@ def rpi_gpio_setup(pin, mode):
         success = rpi_gpio.setup_pin(pin, gpio_mode)
         
         if success:
+            invalidate_json_cache()
             return jsonify({
                 "success": True,
                 "pin": pin,
@@ -252,10 +434,6 @@ def rpi_gpio_setup(pin, mode):
 @app.route("/rpi_gpio/write/<int:pin>/<int:state>", methods=["POST"])
 def rpi_gpio_write(pin, state):
     """Set a Raspberry Pi GPIO output pin high or low."""
-    # Check if RPi GPIO is available
-    if not hardware_status["rpi_gpio"]:
-        return jsonify({"error": "Raspberry Pi GPIO not available"}), 503
-        
     try:
         if state not in [0, 1]:
             return jsonify({"error": "State must be 0 or 1"}), 400
@@ -263,6 +441,7 @@ def rpi_gpio_write(pin, state):
         success = rpi_gpio.set_pin_output(pin, state)
         
         if success:
+            invalidate_json_cache()
             return jsonify({
                 "success": True,
                 "pin": pin,
@@ -279,14 +458,11 @@ def rpi_gpio_write(pin, state):
 @app.route("/rpi_gpio/reset/<int:pin>", methods=["POST"])
 def rpi_gpio_reset(pin):
     """Reset a Raspberry Pi GPIO pin to input mode."""
-    # Check if RPi GPIO is available
-    if not hardware_status["rpi_gpio"]:
-        return jsonify({"error": "Raspberry Pi GPIO not available"}), 503
-        
     try:
         success = rpi_gpio.reset_pin(pin)
         
         if success:
+            invalidate_json_cache()
             return jsonify({
                 "success": True,
                 "pin": pin,
@@ -303,10 +479,6 @@ def rpi_gpio_reset(pin):
 @app.route("/rs485/send", methods=["POST"])
 def rs485_send():
     """Send a message over RS-485."""
-    # Check if RS-485 is available
-    if not hardware_status["rs485"]:
-        return jsonify({"error": "RS-485 not available"}), 503
-        
     try:
         # Handle both JSON and form data
         if request.is_json:
@@ -324,10 +496,11 @@ def rs485_send():
         success = rs485_handler.send_message(msg.strip())
         
         if success:
-            logger.info(f"RS-485 message sent: {msg}")
+            invalidate_json_cache()
+            logger.debug("RS-485 message sent: %s", msg)
             return jsonify({"success": True, "sent": msg})
         else:
-            logger.error(f"Failed to send RS-485 message: {msg}")
+            logger.error("Failed to send RS-485 message: %s", msg)
             return jsonify({"error": "Failed to send message"}), 500
             
     except Exception as e:
@@ -350,7 +523,7 @@ def usb_check():
     try:
         return jsonify({
             "usb_connected": usb_status.usb_connected(),
-            "usb_devices": usb_status.list_usb_devices()
+            "usb_devices": [d.to_dict() for d in usb_status.list_usb_devices()]
         })
     except Exception as e:
         logger.error(f"USB status error: {e}")
@@ -364,6 +537,35 @@ def health_check():
         "services": ["adc", "gpio", "rs485", "usb", "rpi_gpio"]
     })
 
+# --- Route specialization ---
+# Hardware routes are bound once, after init, to either the real view or a
+# 503 stub, so handlers don't re-check hardware_status on every request.
+_ROUTE_REQUIREMENTS = {
+    "gpio_write": ("mcp23017", "MCP23017 not available"),
+    "rpi_gpio_setup": ("rpi_gpio", "Raspberry Pi GPIO not available"),
+    "rpi_gpio_write": ("rpi_gpio", "Raspberry Pi GPIO not available"),
+    "rpi_gpio_reset": ("rpi_gpio", "Raspberry Pi GPIO not available"),
+    "rs485_send": ("rs485", "RS-485 not available"),
+}
+_REAL_VIEWS = {endpoint: app.view_functions[endpoint] for endpoint in _ROUTE_REQUIREMENTS}
+
+def _unavailable_view(message):
+    """Build a view that always reports the component as unavailable."""
+    def view(**kwargs):
+        return jsonify({"error": message}), 503
+    return view
+
+def specialize_routes(status):
+    """Bind each hardware route to its real view or a 503 stub."""
+    for endpoint, (component, message) in _ROUTE_REQUIREMENTS.items():
+        if status.get(component):
+            app.view_functions[endpoint] = _REAL_VIEWS[endpoint]
+        else:
+            app.view_functions[endpoint] = _unavailable_view(message)
+
+# Nothing is available until init_hardware() has run
+specialize_routes(hardware_status)
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors."""
@@ -375,31 +577,39 @@ def internal_error(error):
     logger.error(f"Internal server error: {error}")
     return jsonify({"error": "Internal server error"}), 500
 
+def start_hardware():
+    """Initialize hardware and bind routes, falling back to limited mode.
+    
+    Used by both the development server below and wsgi.py.
+    """
+    global hardware_status
+    try:
+        hardware_status = init_hardware()
+    except Exception as e:
+        logger.error(f"Hardware startup failed: {e}")
+        logger.info("Starting with limited functionality...")
+        hardware_status = {"mcp23017": False, "rs485": False, "rpi_gpio": False}
+    specialize_routes(hardware_status)
+    return hardware_status
+
 if __name__ == "__main__":
+    # Development server; use wsgi.py under gunicorn for production
     try:
         # Initialize hardware before starting the server
-        hardware_status = init_hardware()
+        start_hardware()
         
-        # Run the Flask application
-        app.run(
+        # Run the Flask application (with WebSocket support)
+        socketio.run(
+            app,
             host="0.0.0.0", 
             port=5000, 
             debug=False,  # Set to False for production
-            threaded=True  # Enable threading for better performance
+            allow_unsafe_werkzeug=True
         )
         
     except KeyboardInterrupt:
         logger.info("Application stopped by user")
     except Exception as e:
         logger.error(f"Application startup failed: {e}")
-        logger.info("Starting with limited functionality...")
-        # Try to run with whatever components are working
-        hardware_status = {"mcp23017": False, "rs485": False, "rpi_gpio": False}
-        app.run(
-            host="0.0.0.0", 
-            port=5000, 
-            debug=False,
-            threaded=True
-        )
     finally:
         cleanup_hardware()
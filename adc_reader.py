@@ -1,3 +1,5 @@
+import atexit
+import threading
 import time
 from smbus2 import SMBus
 
@@ -7,11 +9,31 @@ REG_CONV   = 0x00
 REG_CONFIG = 0x01
 
 PGA = {0:6.144, 1:4.096, 2:2.048, 3:1.024, 4:0.512, 5:0.256}
+_VOLTS_PER_COUNT = {k: fs / 2048.0 for k, fs in PGA.items()}
 MUX_SINGLE = {0:0b100, 1:0b101, 2:0b110, 3:0b111}
+DATA_RATE = {0:128, 1:250, 2:490, 3:920, 4:1600, 5:2400, 6:3300, 7:3300}  # samples/s
 
-def _twos_comp_12(x: int) -> int:
-    x &= 0x0FFF
-    return x - 0x1000 if (x & 0x0800) else x
+SETTLE_MARGIN = 50e-6     # extra wait on top of one conversion period
+
+# Shared bus handle, opened on first use (smbus2 is not thread-safe)
+_bus = None
+_bus_lock = threading.Lock()
+
+def _get_bus() -> SMBus:
+    """Return the shared SMBus handle. Caller must hold _bus_lock."""
+    global _bus
+    if _bus is None:
+        _bus = SMBus(I2C_BUS_NUM)
+    return _bus
+
+def _close_bus():
+    global _bus
+    with _bus_lock:
+        if _bus is not None:
+            _bus.close()
+            _bus = None
+
+atexit.register(_close_bus)
 
 def _build_config(mux_code: int, pga_code: int, dr_code: int) -> int:
     cfg  = (1 << 15)
@@ -22,29 +44,45 @@ def _build_config(mux_code: int, pga_code: int, dr_code: int) -> int:
     cfg |= 0b11
     return cfg
 
-def ads1015_read_single(bus: SMBus, addr: int, chan: int, pga_code: int = 1, dr_code: int = 4):
-    mux = MUX_SINGLE[chan]
-    cfg = _build_config(mux, pga_code, dr_code)
+def _conversion_time(dr_code: int) -> float:
+    return 1.0 / DATA_RATE[dr_code] + SETTLE_MARGIN
+
+def _start_conversion(bus: SMBus, addr: int, chan: int, pga_code: int, dr_code: int):
+    cfg = _build_config(MUX_SINGLE[chan], pga_code, dr_code)
     bus.write_i2c_block_data(addr, REG_CONFIG, [(cfg >> 8) & 0xFF, cfg & 0xFF])
 
-    # Wait for conversion
-    t0 = time.time()
-    while True:
-        hi, _ = bus.read_i2c_block_data(addr, REG_CONFIG, 2)
-        if hi & 0x80: break
-        if time.time() - t0 > 0.05: break
+def _decode(hi: int, lo: int, pga_code: int):
+    # 12-bit result is left-justified; sign-extend without branching
+    raw12 = ((((hi << 8) | lo) >> 4) ^ 0x800) - 0x800
+    volts = raw12 * _VOLTS_PER_COUNT[pga_code]
+    return raw12, volts
+
+def ads1015_read_single(bus: SMBus, addr: int, chan: int, pga_code: int = 1, dr_code: int = 4):
+    _start_conversion(bus, addr, chan, pga_code, dr_code)
+
+    # Single-shot conversion finishes within one data-rate period
+    time.sleep(_conversion_time(dr_code))
 
     hi, lo = bus.read_i2c_block_data(addr, REG_CONV, 2)
-    raw16 = (hi << 8) | lo
-    raw12 = _twos_comp_12(raw16 >> 4)
-    fs = PGA[pga_code]
-    volts = (raw12 / 2048.0) * fs
-    return raw12, volts
+    return _decode(hi, lo, pga_code)
+
+def _read_channels(bus: SMBus, pga_code: int = 1, dr_code: int = 4):
+    """Read AIN0-AIN3, starting each conversion as soon as the previous result is in."""
+    delay = _conversion_time(dr_code)
+    readings = {}
+    _start_conversion(bus, ADS_ADDR, 0, pga_code, dr_code)
+    for ch in range(4):
+        time.sleep(delay)
+        hi, lo = bus.read_i2c_block_data(ADS_ADDR, REG_CONV, 2)
+        if ch < 3:
+            _start_conversion(bus, ADS_ADDR, ch + 1, pga_code, dr_code)
+        _, v = _decode(hi, lo, pga_code)
+        readings[f"AIN{ch}"] = round(v, 4)
+    return readings
 
 def read_all_channels():
-    with SMBus(I2C_BUS_NUM) as bus:
-        readings = {}
-        for ch in range(4):
-            _, v = ads1015_read_single(bus, ADS_ADDR, ch)
-            readings[f"AIN{ch}"] = round(v, 4)
-        return readings
+    with _bus_lock:
+        return _read_channels(_get_bus())
+
+# Kept for callers that picked the cached-handle variant explicitly
+read_all_channels_fast = read_all_channels
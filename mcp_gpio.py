@@ -5,6 +5,8 @@ MCP23017 GPIO Library
 - Uses Raspberry Pi GPIO pin 18 as MCP reset (optional).
 """
 
+import atexit
+import threading
 import time
 import RPi.GPIO as GPIO
 import logging
@@ -22,6 +24,8 @@ MCP23017_ADDR = 0x20      # Adjust if A2..A0 not tied to GND
 MCP_RESET_BCM = 18        # Physical pin 12 (optional reset)
 
 # ---- MCP23017 registers ----
+# IOCON.BANK=0 / SEQOP=0 (power-on default): each A/B pair is adjacent and
+# the address pointer auto-increments, so both ports move in one transfer.
 IODIRA = 0x00
 IODIRB = 0x01
 GPIOA  = 0x12
@@ -32,6 +36,27 @@ OLATB  = 0x15
 # Track if we've initialized the reset pin
 _reset_pin_initialized = False
 
+# Shared bus handle, opened on first use (smbus is not thread-safe)
+_bus = None
+_bus_lock = threading.Lock()
+
+def _get_bus():
+    """Return the shared SMBus handle. Caller must hold _bus_lock."""
+    global _bus
+    if _bus is None:
+        _bus = SMBus(I2C_BUS_NUM)
+    return _bus
+
+def _close_bus():
+    """Close the shared SMBus handle if it is open."""
+    global _bus
+    with _bus_lock:
+        if _bus is not None:
+            _bus.close()
+            _bus = None
+
+atexit.register(_close_bus)
+
 def _init_reset_pin():
     """Initialize the MCP23017 reset pin if not already done."""
     global _reset_pin_initialized
@@ -72,12 +97,11 @@ def setup_gpio(dir_a=0x00, dir_b=0x00):
         # Try hardware reset first
         reset_mcp23017()
         
-        with SMBus(I2C_BUS_NUM) as bus:
-            bus.write_byte_data(MCP23017_ADDR, IODIRA, dir_a)
-            bus.write_byte_data(MCP23017_ADDR, IODIRB, dir_b)
+        with _bus_lock:
+            bus = _get_bus()
+            bus.write_i2c_block_data(MCP23017_ADDR, IODIRA, [dir_a, dir_b])
             # Clear outputs at start
-            bus.write_byte_data(MCP23017_ADDR, OLATA, 0x00)
-            bus.write_byte_data(MCP23017_ADDR, OLATB, 0x00)
+            bus.write_i2c_block_data(MCP23017_ADDR, OLATA, [0x00, 0x00])
             logger.info("MCP23017 GPIO initialized successfully")
     except Exception as e:
         logger.error(f"MCP23017 setup failed: {e}")
@@ -86,9 +110,9 @@ def setup_gpio(dir_a=0x00, dir_b=0x00):
 def read_all():
     """Read GPIOA + GPIOB states from MCP23017. Returns (a, b)."""
     try:
-        with SMBus(I2C_BUS_NUM) as bus:
-            a = bus.read_byte_data(MCP23017_ADDR, GPIOA)
-            b = bus.read_byte_data(MCP23017_ADDR, GPIOB)
+        with _bus_lock:
+            bus = _get_bus()
+            a, b = bus.read_i2c_block_data(MCP23017_ADDR, GPIOA, 2)
         return a, b
     except Exception as e:
         logger.error(f"MCP23017 read failed: {e}")
@@ -97,9 +121,9 @@ def read_all():
 def write_outputs(port_a_val=0x00, port_b_val=0x00):
     """Write values to MCP23017 outputs (A and B)."""
     try:
-        with SMBus(I2C_BUS_NUM) as bus:
-            bus.write_byte_data(MCP23017_ADDR, OLATA, port_a_val)
-            bus.write_byte_data(MCP23017_ADDR, OLATB, port_b_val)
+        with _bus_lock:
+            bus = _get_bus()
+            bus.write_i2c_block_data(MCP23017_ADDR, OLATA, [port_a_val, port_b_val])
     except Exception as e:
         logger.error(f"MCP23017 write failed: {e}")
         raise
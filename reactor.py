@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+reactor.py
+Single background event loop shared by the hardware modules
+- Dispatches readable file descriptors (e.g. the RS-485 serial port)
+- Runs periodic jobs (e.g. the WebSocket sampler) on a fixed cadence
+"""
+import logging
+import os
+import selectors
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_selector = selectors.DefaultSelector()
+_timers = []              # [next_due, interval, callback]; interval None = one-shot
+_pending = []             # registration changes applied by the loop thread
+_pending_lock = threading.Lock()
+_thread = None
+_running = False
+
+# Self-pipe so other threads can wake the loop out of select()
+_wake_r, _wake_w = os.pipe()
+os.set_blocking(_wake_r, False)
+os.set_blocking(_wake_w, False)
+_selector.register(_wake_r, selectors.EVENT_READ)
+
+def _wake():
+    try:
+        os.write(_wake_w, b"\0")
+    except BlockingIOError:
+        pass  # a wake-up is already queued
+
+def _call_in_loop(fn):
+    """Queue a registration change for the loop thread."""
+    with _pending_lock:
+        _pending.append(fn)
+    _wake()
+
+def _run_pending():
+    with _pending_lock:
+        changes = _pending[:]
+        _pending.clear()
+    for fn in changes:
+        try:
+            fn()
+        except Exception as e:
+            logger.error(f"Reactor registration failed: {e}")
+
+def add_reader(fd, callback):
+    """Call callback() from the loop whenever fd is readable."""
+    _call_in_loop(lambda: _selector.register(fd, selectors.EVENT_READ, data=callback))
+
+def remove_reader(fd):
+    """Stop watching fd."""
+    def _remove():
+        try:
+            _selector.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+    _call_in_loop(_remove)
+
+def add_periodic(interval, callback):
+    """Call callback() from the loop every interval seconds."""
+    _call_in_loop(lambda: _timers.append([time.monotonic() + interval, interval, callback]))
+
+def call_later(delay, callback):
+    """Call callback() once from the loop after delay seconds."""
+    _call_in_loop(lambda: _timers.append([time.monotonic() + delay, None, callback]))
+
+def remove_periodic(callback):
+    """Cancel a job added with add_periodic() or call_later()."""
+    def _remove():
+        _timers[:] = [t for t in _timers if t[2] is not callback]
+    _call_in_loop(_remove)
+
+def _next_timeout():
+    if not _timers:
+        return None
+    return max(0.0, min(t[0] for t in _timers) - time.monotonic())
+
+def _loop():
+    while _running:
+        _run_pending()
+        for key, _ in _selector.select(_next_timeout()):
+            if key.fd == _wake_r:
+                try:
+                    os.read(_wake_r, 512)
+                except BlockingIOError:
+                    pass
+                continue
+            try:
+                key.data()
+            except Exception as e:
+                # Drop the reader so a dead fd can't spin the loop
+                logger.error(f"Reactor reader failed, unregistering: {e}")
+                _selector.unregister(key.fd)
+
+        now = time.monotonic()
+        for timer in _timers[:]:
+            if timer[0] > now:
+                continue
+            if timer[1] is None:
+                _timers.remove(timer)
+            else:
+                # Keep the cadence; if we fell behind, restart from now
+                timer[0] += timer[1]
+                if timer[0] <= now:
+                    timer[0] = now + timer[1]
+            try:
+                timer[2]()
+            except Exception as e:
+                logger.error(f"Reactor job failed: {e}")
+
+def start():
+    """Start the loop thread (non-blocking). Safe to call more than once."""
+    global _thread, _running
+    if _thread is not None and _thread.is_alive():
+        return
+    _running = True
+    _thread = threading.Thread(target=_loop, name="reactor", daemon=True)
+    _thread.start()
+
+def stop():
+    """Ask the loop thread to exit."""
+    global _running
+    _running = False
+    _wake()
@@ -6,6 +6,8 @@ Raspberry Pi GPIO control module
 - Reads pin states
 - Safe initialization and cleanup
 """
+import mmap
+import os
 import RPi.GPIO as GPIO
 import logging
 
@@ -14,17 +16,66 @@ logger = logging.getLogger(__name__)
 # Common GPIO pins that are safe to use (avoiding I2C, SPI, UART pins and user-specified pins)
 # Excluded physical pins: 3, 5, 8, 10, 12, 13, 29, 31, 32, 33
 # Excluded BCM pins: 2, 3, 14, 19, 18, 27, 5, 6, 12, 13
-SAFE_PINS = [4, 17, 22, 10, 9, 11, 26, 15, 23, 24, 25, 8, 7, 16, 20, 21]
+SAFE_PINS = frozenset({4, 17, 22, 10, 9, 11, 26, 15, 23, 24, 25, 8, 7, 16, 20, 21})
 
 # Current pin configurations
 pin_configs = {}
 pin_states = {}
 
+# BCM283x GPIO register block, for reading every pin level in one load
+GPIOMEM_DEV = "/dev/gpiomem"
+GPLEV0_OFFSET = 0x34      # pin level register for GPIO 0-31
+_gpio_regs = None         # mmap of the register block
+_gpio_words = None        # 32-bit view over _gpio_regs
+
+# SoCs that share the BCM283x GPIO register layout (the Pi 5's RP1 does not)
+DT_COMPATIBLE = "/proc/device-tree/compatible"
+GPLEV_SOCS = frozenset({"brcm,bcm2835", "brcm,bcm2836", "brcm,bcm2837", "brcm,bcm2711"})
+
+def _soc_has_gplev():
+    """True if the device tree names a SoC with GPLEV0 at GPLEV0_OFFSET."""
+    try:
+        with open(DT_COMPATIBLE, "rb") as f:
+            compatible = f.read().decode("ascii", "replace").split("\0")
+    except OSError:
+        return False
+    return not GPLEV_SOCS.isdisjoint(compatible)
+
+def _map_gpio_regs():
+    """Map the GPIO registers read-only; leave them unmapped if unavailable."""
+    global _gpio_regs, _gpio_words
+    if _gpio_regs is not None:
+        return
+    if not _soc_has_gplev():
+        logger.info("GPIO register layout not recognised, reading pins one at a time")
+        return
+    try:
+        fd = os.open(GPIOMEM_DEV, os.O_RDWR | os.O_SYNC)
+        try:
+            _gpio_regs = mmap.mmap(fd, 4096, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        _gpio_words = memoryview(_gpio_regs).cast("I")
+        logger.info(f"Mapped {GPIOMEM_DEV} for batched pin reads")
+    except Exception as e:
+        logger.info(f"{GPIOMEM_DEV} not usable ({e}), reading pins one at a time")
+
+def _unmap_gpio_regs():
+    """Release the GPIO register mapping."""
+    global _gpio_regs, _gpio_words
+    if _gpio_words is not None:
+        _gpio_words.release()
+        _gpio_words = None
+    if _gpio_regs is not None:
+        _gpio_regs.close()
+        _gpio_regs = None
+
 def init_rpi_gpio():
     """Initialize Raspberry Pi GPIO system."""
     try:
         GPIO.setwarnings(False)
         GPIO.setmode(GPIO.BCM)
+        _map_gpio_regs()
         logger.info("Raspberry Pi GPIO initialized")
         return True
     except Exception as e:
@@ -65,7 +116,7 @@ def set_pin_output(pin, state):
         
         GPIO.output(pin, state)
         pin_states[pin] = state  # ✅ Store last commanded state
-        logger.info(f"Pin {pin} set to {'HIGH' if state else 'LOW'}")
+        logger.debug("Pin %d set to %s", pin, "HIGH" if state else "LOW")
         return True
     except Exception as e:
         logger.error(f"Failed to set pin {pin}: {e}")
@@ -92,8 +143,18 @@ def get_pin_state(pin):
 def get_all_pin_states():
     """Get states of all configured pins."""
     states = {}
-    for pin in pin_configs:
-        states[pin] = get_pin_state(pin)
+    if _gpio_words is None:
+        for pin in list(pin_configs):
+            states[pin] = get_pin_state(pin)
+        return states
+    
+    # One register load covers every input pin
+    levels = _gpio_words[GPLEV0_OFFSET // 4]
+    for pin, mode in list(pin_configs.items()):
+        if mode == GPIO.OUT:
+            states[pin] = pin_states.get(pin, GPIO.LOW)
+        else:
+            states[pin] = pin_states[pin] = (levels >> pin) & 1
     return states
 
 def get_pin_config(pin):
@@ -124,6 +185,7 @@ def cleanup_rpi_gpio():
     """Clean up GPIO resources."""
     try:
         GPIO.cleanup()
+        _unmap_gpio_regs()
         pin_configs.clear()
         pin_states.clear()
         logger.info("Raspberry Pi GPIO cleanup completed")
@@ -131,8 +193,8 @@ def cleanup_rpi_gpio():
         logger.error(f"GPIO cleanup error: {e}")
 
 def get_safe_pins():
-    """Return list of safe GPIO pins to use."""
-    return SAFE_PINS.copy()
+    """Return the (immutable) set of safe GPIO pins to use."""
+    return SAFE_PINS
 
 # Initialize some common pins as outputs for testing
 def init_default_pins():
@@ -146,7 +208,7 @@ if __name__ == "__main__":
     # Test the module
     if init_rpi_gpio():
         init_default_pins()
-        print("Available pins:", get_safe_pins())
+        print("Available pins:", sorted(get_safe_pins()))
         print("Configured pins:", get_all_configs())
         print("Pin states:", get_all_pin_states())
         cleanup_rpi_gpio()
@@ -1,36 +1,83 @@
 #!/usr/bin/env python3
 """
 RS-485 Handler Module
-- Listens for incoming RS485 messages in the background
+- Listens for incoming RS485 messages in the background (via reactor)
 - Provides function to send messages from web app
 - Ensures GPIO cleanup so pins are never left 'busy'
 """
+import logging
+import re
+import threading
 import time
 import serial
-import threading
+import serial.rs485
 import RPi.GPIO as GPIO
+import reactor
+
+logger = logging.getLogger(__name__)
 
 # --- RS485 config ---
 RS485_DE_BCM = 6          # GPIO6 controls DE/RE (HIGH=TX, LOW=RX)
 SERIAL_PORT = "/dev/serial0"
 BAUD = 9600
+# Let the UART driver toggle DE/RE via RTS (TIOCSRS485). Only enable this if
+# DE/RE is wired to the UART's RTS pin; otherwise RS485_DE_BCM is driven.
+RS485_KERNEL_DE = False
+
+# --- DE timing (derived from the baud rate) ---
+CHAR_TIME = 11 / BAUD                 # one character on the wire, with margin
+DE_SETUP_TIME = max(1e-4, CHAR_TIME)  # DE high before the first start bit
+DE_HOLD_TIME = 2 * CHAR_TIME          # DE high after the UART reports empty
+
+# --- RX framing ---
+RX_MAX_LINE = 1024        # bytes buffered before a line is published regardless
+RX_IDLE_FLUSH = 1.0       # publish a partial line after this long without data
+RX_RETRY_DELAY = 5.0      # seconds before re-arming RX after a read error
+_RX_EOL = re.compile(rb"[\r\n]")
 
 # --- Globals ---
 last_message = None
-_running = True
+_rx_buffer = bytearray()   # bytes received since the last newline
+_rx_last = 0.0             # monotonic time of the last read
+_rx_flush_armed = False    # idle-flush timer pending
+_rx_fd = None              # serial fd while registered with the reactor
+_rx_wanted = False         # start_listener() called and not stopped
+_kernel_de = False         # True once the kernel owns DE/RE timing
+_rx_callbacks = []         # called as callback(msg, ts) for every RX line
+_rx_cond = threading.Condition()
+_rx_seq = 0                # bumped on every RX line, for wait_for_message()
 
 # Initialize serial (open once and reuse)
+# timeout=0: reads never block; the reactor only calls us when data is waiting
 ser = serial.Serial(
     port=SERIAL_PORT,
     baudrate=BAUD,
     parity=serial.PARITY_NONE,
     stopbits=serial.STOPBITS_ONE,
     bytesize=serial.EIGHTBITS,
-    timeout=1,
+    timeout=0,
 )
 
+def _enable_kernel_de():
+    """Hand DE/RE control to the UART driver. Returns True on success."""
+    try:
+        ser.rs485_mode = serial.rs485.RS485Settings(
+            rts_level_for_tx=True,   # SER_RS485_RTS_ON_SEND
+            rts_level_for_rx=False,
+        )
+        logger.info("RS485: kernel DE/RE control enabled")
+        return True
+    except (ValueError, OSError, NotImplementedError) as e:
+        logger.warning("RS485: kernel DE/RE not supported, using GPIO: %s", e)
+        return False
+
 def init_gpio():
-    """Setup DE/RE control pin for RS485 transceiver."""
+    """Setup DE/RE control for RS485 transceiver."""
+    global _kernel_de
+    if RS485_KERNEL_DE and _enable_kernel_de():
+        _kernel_de = True
+        return
+    
     # Release the pin first in case it's stuck as 'busy'
     try:
         GPIO.cleanup(RS485_DE_BCM)
@@ -40,24 +87,119 @@ def init_gpio():
     GPIO.setmode(GPIO.BCM)
     GPIO.setup(RS485_DE_BCM, GPIO.OUT, initial=GPIO.LOW)  # default RX
 
-def _listen_loop():
-    """Background thread: read incoming RS485 messages."""
-    global last_message
-    while _running:
+def _on_readable():
+    """Reactor callback: drain the UART and publish complete lines."""
+    global _rx_last, _rx_flush_armed
+    try:
+        _rx_buffer.extend(ser.read(ser.in_waiting or 1))
+    except Exception as e:
+        logger.error("RS485 read error, RX paused for %.0f s: %s", RX_RETRY_DELAY, e)
+        _suspend_listener()
+        return
+    _rx_last = time.monotonic()
+    
+    # Lines end in \n, \r or \r\n (the empty line between \r and \n is skipped)
+    start = 0
+    for eol in _RX_EOL.finditer(_rx_buffer):
+        _publish_bytes(_rx_buffer[start:eol.start()])
+        start = eol.end()
+    del _rx_buffer[:start]
+    
+    # A runaway unterminated line is published in RX_MAX_LINE chunks
+    while len(_rx_buffer) >= RX_MAX_LINE:
+        _publish_bytes(_rx_buffer[:RX_MAX_LINE])
+        del _rx_buffer[:RX_MAX_LINE]
+    
+    if _rx_buffer and not _rx_flush_armed:
+        _rx_flush_armed = True
+        reactor.call_later(RX_IDLE_FLUSH, _flush_idle)
+
+def _flush_idle():
+    """One-shot timer: publish a partial line once the port has gone quiet."""
+    global _rx_flush_armed
+    idle = time.monotonic() - _rx_last
+    if _rx_buffer and idle < RX_IDLE_FLUSH:
+        # Data arrived since the timer was armed; check again later
+        reactor.call_later(RX_IDLE_FLUSH - idle, _flush_idle)
+        return
+    _rx_flush_armed = False
+    _publish_bytes(_rx_buffer)
+    _rx_buffer.clear()
+
+def _publish_bytes(line):
+    msg = line.decode("utf-8", errors="replace").strip()
+    if msg:
+        logger.debug("RX %s", msg)
+        _publish(msg)
+
+def _publish(msg):
+    """Record a received line and notify waiters and callbacks."""
+    global last_message, _rx_seq
+    ts = time.time()
+    with _rx_cond:
+        last_message = msg
+        _rx_seq += 1
+        _rx_cond.notify_all()
+    for callback in _rx_callbacks:
         try:
-            if ser.in_waiting:
-                msg = ser.readline().decode("utf-8", errors="replace").strip()
-                if msg:
-                    print("RX:", msg)
-                    last_message = msg
+            callback(msg, ts)
         except Exception as e:
-            print("RS485 read error:", e)
-            time.sleep(1)
+            logger.error("RS485 RX callback failed: %s", e)
+
+def add_rx_callback(callback):
+    """Register callback(msg, ts), run on the reactor thread for each RX line."""
+    if callback not in _rx_callbacks:
+        _rx_callbacks.append(callback)
+
+def wait_for_message(timeout=None):
+    """Block until the next RX line arrives. Returns it, or None on timeout."""
+    with _rx_cond:
+        seq = _rx_seq
+        if not _rx_cond.wait_for(lambda: _rx_seq != seq, timeout):
+            return None
+        return last_message
 
 def start_listener():
-    """Start background listener thread (non-blocking)."""
-    t = threading.Thread(target=_listen_loop, daemon=True)
-    t.start()
+    """Watch the serial port from the shared reactor thread (non-blocking)."""
+    global _rx_wanted
+    _rx_wanted = True
+    _register_reader()
+    reactor.start()
+
+def _register_reader():
+    global _rx_fd
+    if _rx_fd is not None:
+        return
+    _rx_fd = ser.fileno()
+    reactor.add_reader(_rx_fd, _on_readable)
+
+def _unregister_reader():
+    global _rx_fd
+    if _rx_fd is not None:
+        reactor.remove_reader(_rx_fd)
+        _rx_fd = None
+
+def _suspend_listener():
+    """Drop the reader after a read error and re-arm it after RX_RETRY_DELAY."""
+    _unregister_reader()
+    reactor.call_later(RX_RETRY_DELAY, _resume_listener)
+
+def _resume_listener():
+    if not _rx_wanted:
+        return  # stopped while paused
+    try:
+        ser.reset_input_buffer()
+        _register_reader()
+        logger.info("RS485 RX resumed")
+    except Exception as e:
+        logger.error("RS485 RX still failing, retrying in %.0f s: %s", RX_RETRY_DELAY, e)
+        reactor.call_later(RX_RETRY_DELAY, _resume_listener)
+
+def stop_listener():
+    """Stop watching the serial port."""
+    global _rx_wanted
+    _rx_wanted = False
+    _unregister_reader()
 
 def get_last_message():
     """Return most recent RX message (or None)."""
@@ -66,21 +208,27 @@ def get_last_message():
 def send_message(msg: str):
     """Send a message over RS485 (string)."""
     try:
+        if _kernel_de:
+            # The driver raises DE for exactly as long as it is shifting bits
+            ser.write((msg + "\n").encode())
+            logger.debug("TX %s", msg)
+            return True
+        
         GPIO.output(RS485_DE_BCM, GPIO.HIGH)  # enable TX
-        time.sleep(0.01)
+        time.sleep(DE_SETUP_TIME)
         ser.write((msg + "\n").encode())
-        ser.flush()
+        ser.flush()                           # tcdrain(): wait for the UART to go empty
+        time.sleep(DE_HOLD_TIME)              # let the last stop bit clear the line
         GPIO.output(RS485_DE_BCM, GPIO.LOW)   # back to RX
-        print("TX:", msg)
+        logger.debug("TX %s", msg)
         return True
     except Exception as e:
-        print("RS485 send error:", e)
+        logger.error("RS485 send error: %s", e)
         return False
 
 def cleanup():
     """Stop listener, close serial, release GPIO."""
-    global _running
-    _running = False
+    stop_listener()
     try:
         ser.close()
     except Exception:
@@ -92,6 +240,7 @@ def cleanup():
 
 # --- Standalone test mode ---
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)  # show TX/RX lines
     init_gpio()
     start_listener()
     try:
@@ -1,109 +1,398 @@
 """
 usb_status.py
 Enhanced USB device monitoring with device listing and caching
+- Reads /sys/bus/usb/devices directly, falling back to libusb (usb1) or lsusb
+- Invalidates the cache on udev hotplug events (pyudev) when available
 """
 
+import os
 import subprocess
 import logging
 import re
-from functools import lru_cache
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 import time
 
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import usb1
+except ImportError:
+    usb1 = None
+
 logger = logging.getLogger(__name__)
 
 # Cache results for 5 seconds to avoid excessive system calls
 CACHE_TIMEOUT = 5
-_last_cache_time = 0
-_cached_devices = []
+# While udev invalidates the cache on hotplug, the TTL is only a safety net
+MONITOR_CACHE_TIMEOUT = 60
+# A failed scan is cached as "no devices" for this long, to throttle retries
+NEGATIVE_TTL = 1
+_cache_timeout = CACHE_TIMEOUT
+# time.monotonic() timestamps, immune to NTP/wall-clock steps. Monotonic time
+# can be small just after boot, so "never scanned" is -inf rather than 0
+_NEVER = float("-inf")
+_last_cache_time = _NEVER
+_cached_devices = ()
+_cached_index = {}               # lowercase "vvvv:pppp" -> device
+_cache_generation = 0            # bumped by clear_cache()
+_cache_lock = threading.Lock()   # guards the cache globals above
+_scan_lock = threading.Lock()    # one scan (sysfs/lsusb) at a time
 
-def usb_connected():
-    """Return True if any USB devices are connected, False otherwise."""
+# Stale hits are served immediately and refreshed on this worker
+_refresh_inflight = False
+_refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="usb-refresh")
+
+# One lsusb line: "Bus XXX Device YYY: ID XXXX:YYYY Description"
+_USB_LINE_RE = re.compile(
+    r'^Bus (\d+) Device (\d+): ID ([0-9a-f]{4}):([0-9a-f]{4})\s*(.*)$',
+    re.IGNORECASE
+)
+
+# Same line shape for hyperscan, matched over the whole lsusb output at once
+_HS_LINE_PATTERN = rb'^Bus \d+ Device \d+: ID [0-9a-f]{4}:[0-9a-f]{4}[^\n]*'
+
+SYSFS_USB_DEVICES = "/sys/bus/usb/devices"
+
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+# Linux Foundation 1.1 / 2.0 / 3.0 root hubs (lsusb prints ids in lowercase)
+_ROOT_HUB_IDS = frozenset({"1d6b:0001", "1d6b:0002", "1d6b:0003"})
+
+# udev hotplug monitor, if running
+_observer = None
+
+# libusb context, opened on first use (scans hold _scan_lock)
+_usb1_context = None
+
+USB_CLASS_HUB = 0x09
+
+def _compile_hs_db():
+    """Compile the lsusb line pattern for hyperscan, or None if unavailable."""
+    if hyperscan is None:
+        return None
     try:
-        result = subprocess.run(
-            ["lsusb"], 
-            capture_output=True, 
-            text=True, 
-            timeout=5  # Prevent hanging
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[_HS_LINE_PATTERN],
+            ids=[0],
+            flags=[hyperscan.HS_FLAG_MULTILINE | hyperscan.HS_FLAG_CASELESS
+                   | hyperscan.HS_FLAG_SOM_LEFTMOST],
         )
-        
-        if result.returncode != 0:
-            logger.warning(f"lsusb returned error code {result.returncode}")
-            return False
-            
-        # Filter out the root hub entries (they're always present)
-        lines = result.stdout.strip().split('\n')
-        device_lines = [line for line in lines if line and 'root hub' not in line.lower()]
-        
-        return len(device_lines) > 0
-        
-    except subprocess.TimeoutExpired:
-        logger.error("lsusb command timed out")
-        return False
+        return db
     except Exception as e:
-        logger.error(f"USB check failed: {e}")
-        return False
+        logger.warning("hyperscan compile failed, using re: %s", e)
+        return None
+
+_hs_db = _compile_hs_db()
+
+@dataclass(frozen=True)
+class UsbDevice:
+    """One connected USB device. Immutable so cached snapshots can be shared."""
+    __slots__ = ("bus", "device", "vendor_id", "product_id", "description", "id")
+    bus: int
+    device: int
+    vendor_id: str
+    product_id: str
+    description: str
+    id: str
+
+    def to_dict(self):
+        """Plain dict for JSON / Socket.IO payloads."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+def usb_connected():
+    """Return True if any USB devices are connected, False otherwise."""
+    # Shares list_usb_devices()' cache; a failed scan reads as "no devices"
+    return bool(list_usb_devices())
 
 def list_usb_devices():
-    """Return a list of connected USB devices with details."""
-    global _last_cache_time, _cached_devices
+    """Return a tuple of connected USB devices with details."""
+    global _refresh_inflight
     
-    # Return cached results if still valid
-    current_time = time.time()
-    if current_time - _last_cache_time < CACHE_TIMEOUT:
+    # Fast path: a fresh cache needs no lock (the tuple is never mutated)
+    if time.monotonic() - _last_cache_time < _cache_timeout:
         return _cached_devices
     
+    with _cache_lock:
+        if _last_cache_time != _NEVER:
+            # Stale: serve the old snapshot, refresh in the background
+            if not _refresh_inflight:
+                _refresh_inflight = True
+                _refresh_executor.submit(_background_refresh)
+            return _cached_devices
+    
+    # Nothing cached yet (startup or clear_cache()): scan in this thread
+    devices = _refresh_cache()
+    return () if devices is None else devices
+
+def _refresh_cache():
+    """Scan and publish a new snapshot. Returns it, or None on failure."""
+    global _last_cache_time, _cached_devices, _cached_index
+    
+    with _scan_lock:
+        with _cache_lock:
+            # Another thread may have refreshed while we waited for the lock
+            if time.monotonic() - _last_cache_time < _cache_timeout:
+                return _cached_devices
+            generation = _cache_generation
+        
+        started = time.monotonic()
+        devices = _scan_usb_devices()
+        failed = devices is None
+        devices = () if failed else tuple(devices)
+        
+        with _cache_lock:
+            # A clear_cache() during the scan means this result may predate it
+            if generation == _cache_generation:
+                # Publish index and devices before the timestamp so the fast
+                # path never pairs a new timestamp with old data
+                _cached_index = {d.id.lower(): d for d in devices}
+                _cached_devices = devices
+                if failed:
+                    # Back-date so the entry expires after NEGATIVE_TTL
+                    _last_cache_time = started - (_cache_timeout - NEGATIVE_TTL)
+                else:
+                    _last_cache_time = started
+        return None if failed else devices
+
+def _background_refresh():
+    global _refresh_inflight
+    try:
+        _refresh_cache()
+    finally:
+        with _cache_lock:
+            _refresh_inflight = False
+
+def _scan_usb_devices():
+    """Scan USB devices. Returns a device list, or None on failure."""
+    try:
+        return _read_sysfs_devices()
+    except FileNotFoundError:
+        # No sysfs (not Linux, or a restricted container)
+        pass
+    except Exception as e:
+        logger.error("Failed to read USB devices from sysfs: %s", e)
+        return None
+    
+    if usb1 is not None:
+        devices = _scan_libusb()
+        if devices is not None:
+            return devices
+    return _scan_lsusb()
+
+def _read_sysfs_attr(path, name):
+    """Return a stripped sysfs attribute, or "" if it doesn't exist."""
+    try:
+        with open(os.path.join(path, name)) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def _read_sysfs_devices():
+    """List USB devices from sysfs, skipping root hubs and interfaces."""
+    devices = []
+    with os.scandir(SYSFS_USB_DEVICES) as entries:
+        for entry in entries:
+            # Devices are "<bus>-<port>[.<port>...]"; root hubs are "usbN"
+            # and interfaces carry a ":<config>.<intf>" suffix
+            if not entry.name[0].isdigit() or ":" in entry.name:
+                continue
+            vendor_id = _read_sysfs_attr(entry.path, "idVendor")
+            product_id = _read_sysfs_attr(entry.path, "idProduct")
+            if not vendor_id or not product_id:
+                continue
+            description = " ".join(filter(None, (
+                _read_sysfs_attr(entry.path, "manufacturer"),
+                _read_sysfs_attr(entry.path, "product"),
+            )))
+            devices.append(_make_device(
+                int(_read_sysfs_attr(entry.path, "busnum") or 0),
+                int(_read_sysfs_attr(entry.path, "devnum") or 0),
+                vendor_id, product_id, description
+            ))
+    devices.sort(key=lambda d: (d.bus, d.device))
+    return devices
+
+def _usb1_string(getter):
+    """Read a string descriptor, or "" if the device can't be opened."""
+    try:
+        return getter() or ""
+    except usb1.USBError:
+        return ""
+
+def _scan_libusb():
+    """List USB devices through libusb. Returns a device list, or None on failure."""
+    global _usb1_context
+    try:
+        if _usb1_context is None:
+            _usb1_context = usb1.USBContext().open()
+        
+        devices = []
+        for dev in _usb1_context.getDeviceList(skip_on_error=True):
+            # Root hubs are hub-class devices with no port path
+            if dev.getDeviceClass() == USB_CLASS_HUB and not dev.getPortNumberList():
+                continue
+            description = " ".join(filter(None, (
+                _usb1_string(dev.getManufacturer),
+                _usb1_string(dev.getProduct),
+            )))
+            devices.append(_make_device(
+                dev.getBusNumber(),
+                dev.getDeviceAddress(),
+                f"{dev.getVendorID():04x}",
+                f"{dev.getProductID():04x}",
+                description
+            ))
+        devices.sort(key=lambda d: (d.bus, d.device))
+        return devices
+        
+    except Exception as e:
+        logger.warning("libusb scan failed, falling back to lsusb: %s", e)
+        return None
+
+def _scan_lsusb():
+    """Run lsusb and parse it. Returns a device list, or None on failure."""
     try:
         result = subprocess.run(
             ["lsusb"], 
             capture_output=True, 
-            text=True, 
+            stdin=subprocess.DEVNULL,
             timeout=5
         )
         
         if result.returncode != 0:
-            logger.warning(f"lsusb returned error code {result.returncode}")
-            return []
+            logger.warning("lsusb returned error code %d", result.returncode)
+            return None
         
+        # Root hubs are recognised by id, not by the (localised) description
         devices = []
-        for line in result.stdout.strip().split('\n'):
-            if line and 'root hub' not in line.lower():
-                device_info = parse_usb_line(line)
-                if device_info:
-                    devices.append(device_info)
-        
-        # Update cache
-        _cached_devices = devices
-        _last_cache_time = current_time
+        for line in _lsusb_lines(result.stdout):
+            device_info = parse_usb_line(line.decode('utf-8', 'replace'))
+            if device_info and device_info.id not in _ROOT_HUB_IDS:
+                devices.append(device_info)
         
         return devices
         
     except subprocess.TimeoutExpired:
         logger.error("lsusb command timed out")
-        return []
+        return None
     except Exception as e:
-        logger.error(f"Failed to list USB devices: {e}")
-        return []
+        logger.error("Failed to list USB devices: %s", e)
+        return None
+
+def _lsusb_lines(output):
+    """Yield lsusb output lines as bytes; with hyperscan, only lines that match."""
+    if _hs_db is None:
+        yield from output.splitlines()
+        return
+    
+    # [^\n]* reports every end offset; keep the longest match per line start
+    spans = {}
+    def on_match(_id, start, end, _flags, _context):
+        spans[start] = end
+    # Only ever called under _scan_lock, so the shared scratch is safe
+    _hs_db.scan(output, match_event_handler=on_match)
+    for start, end in spans.items():
+        yield output[start:end]
+
+def _on_udev_event(device):
+    """udev callback: a USB device came or went, so rescan on this thread."""
+    # bind/unbind/change follow add/remove for the same device; one scan is enough
+    if device.action not in ("add", "remove"):
+        return
+    _expire_cache()
+    _refresh_cache()
+
+def start_monitor():
+    """Start watching udev for USB hotplug events (non-blocking)."""
+    global _observer, _cache_timeout
+    if _observer is not None:
+        return True
+    if pyudev is None:
+        logger.info("pyudev not installed, polling USB devices every %d s", _cache_timeout)
+        return False
+    
+    try:
+        context = pyudev.Context()
+        monitor = pyudev.Monitor.from_netlink(context)
+        monitor.filter_by(subsystem="usb", device_type="usb_device")
+        
+        observer = pyudev.MonitorObserver(monitor, callback=_on_udev_event, name="usb-monitor")
+        observer.daemon = True
+        observer.start()
+        _observer = observer
+        _cache_timeout = MONITOR_CACHE_TIMEOUT
+        clear_cache()  # anything cached so far predates the monitor
+        logger.info("USB hotplug monitor started")
+        return True
+    except Exception as e:
+        logger.warning("Could not start USB hotplug monitor: %s", e)
+        return False
+
+def stop_monitor():
+    """Stop the udev monitor and fall back to short-TTL polling."""
+    global _observer, _cache_timeout
+    _cache_timeout = CACHE_TIMEOUT
+    if _observer is not None:
+        try:
+            _observer.stop()
+        except Exception as e:
+            logger.warning("USB monitor stop warning: %s", e)
+        _observer = None
+
+def _make_device(bus, device, vendor_id, product_id, description):
+    """Build the UsbDevice returned by list_usb_devices()."""
+    return UsbDevice(
+        bus=bus,
+        device=device,
+        vendor_id=vendor_id,
+        product_id=product_id,
+        description=description or "Unknown Device",
+        id=f"{vendor_id}:{product_id}"
+    )
+
+def _parse_usb_line_fast(line):
+    """Parse a well-formed lsusb line with str.split; None if it doesn't fit."""
+    parts = line.split(' ', 5)
+    if len(parts) != 6 or parts[0] != 'Bus' or parts[2] != 'Device' or parts[4] != 'ID':
+        return None
+    if not parts[3].endswith(':'):
+        return None
+    bus, device, rest = parts[1], parts[3][:-1], parts[5]
+    if not (bus.isascii() and bus.isdigit() and device.isascii() and device.isdigit()):
+        return None
+    # rest: "xxxx:yyyy Description"
+    if len(rest) < 9 or rest[4] != ':' or not _HEX_DIGITS.issuperset(rest[:4] + rest[5:9]):
+        return None
+    if len(rest) > 9 and not rest[9].isspace():
+        return None
+    return _make_device(int(bus), int(device), rest[:4], rest[5:9], rest[9:].strip())
 
 def parse_usb_line(line):
     """Parse a single line from lsusb output."""
     try:
         # Example: "Bus 001 Device 002: ID 1d6b:0002 Linux Foundation 2.0 root hub"
-        # Pattern: Bus XXX Device YYY: ID XXXX:YYYY Description
-        pattern = r'Bus (\d+) Device (\d+): ID ([0-9a-f]{4}):([0-9a-f]{4})\s*(.*)'
-        match = re.match(pattern, line, re.IGNORECASE)
+        device_info = _parse_usb_line_fast(line)
+        if device_info:
+            return device_info
         
+        # Unusual spacing etc. - let the regex decide
+        match = _USB_LINE_RE.match(line)
         if match:
             bus, device, vendor_id, product_id, description = match.groups()
-            return {
-                "bus": int(bus),
-                "device": int(device),
-                "vendor_id": vendor_id,
-                "product_id": product_id,
-                "description": description.strip() or "Unknown Device",
-                "id": f"{vendor_id}:{product_id}"
-            }
+            return _make_device(int(bus), int(device), vendor_id, product_id, description.strip())
     except Exception as e:
-        logger.debug(f"Failed to parse USB line '{line}': {e}")
+        logger.debug("Failed to parse USB line %r: %s", line, e)
     
     return None
 
@@ -114,24 +403,35 @@ def get_device_count():
 
 def find_device_by_id(vendor_id, product_id):
     """Find a specific USB device by vendor and product ID."""
-    devices = list_usb_devices()
-    target_id = f"{vendor_id:04x}:{product_id:04x}".lower()
-    
-    for device in devices:
-        if device["id"].lower() == target_id:
-            return device
-    return None
+    return find_device_by_id_raw(f"{vendor_id:04x}:{product_id:04x}")
+
+def find_device_by_id_raw(key):
+    """Find a USB device by a preformatted lowercase "vvvv:pppp" id."""
+    # Same snapshot (and index) as list_usb_devices(); empty on scan failure
+    if not list_usb_devices():
+        return None
+    return _cached_index.get(key)
 
 def clear_cache():
     """Clear the device cache to force a refresh."""
-    global _last_cache_time, _cached_devices
-    _last_cache_time = 0
-    _cached_devices = []
+    global _last_cache_time, _cache_generation
+    # Keep the old tuple so lock-free readers never see an empty list
+    with _cache_lock:
+        _cache_generation += 1
+        _last_cache_time = _NEVER
+
+def _expire_cache():
+    """Mark the snapshot stale but still servable, and void scans in flight."""
+    global _last_cache_time, _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        if _last_cache_time != _NEVER:
+            _last_cache_time = time.monotonic() - _cache_timeout
 
 # For backward compatibility and testing
 if __name__ == "__main__":
     print("USB Connected:", usb_connected())
     print("USB Devices:")
     for device in list_usb_devices():
-        print(f"  {device['description']} (ID: {device['id']})")
+        print(f"  {device.description} (ID: {device.id})")
     print(f"Total devices: {get_device_count()}")
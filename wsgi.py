@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for the Top HAT dashboard
+- Initializes hardware once, then exposes the Flask app to gunicorn
+- Run with a single worker; the hardware can only be owned by one process:
+    gunicorn -k gthread -w 1 --threads 100 -b 0.0.0.0:5000 wsgi:application
+"""
+from TopHatDashboard import app, start_hardware
+
+start_hardware()
+application = app